@@ -1,4 +1,5 @@
 import streamlit as st
+import textwrap
 from datetime import datetime
 from bot import HospitalReimbursementBot
 import pandas as pd
@@ -12,8 +13,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for styling
-st.markdown("""
+# Custom CSS for styling, emitted as a single element per run
+_CSS = """
     <style>
         .main-header {font-size: 2.5rem; color: #1E3F66; margin-bottom: 1rem;}
         .sub-header {color: #2E5A88; margin: 1.5rem 0 1rem 0;}
@@ -47,39 +48,8 @@ st.markdown("""
             margin: 1rem 0;
             box-shadow: 0 2px 10px rgba(0,0,0,0.1);
         }
-    </style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'bot' not in st.session_state:
-    st.session_state.bot = HospitalReimbursementBot(data_folder='data')
-    try:
-        # Load and process data when the app starts
-        with st.spinner("Loading reimbursement data..."):
-            # Force reload data
-            st.session_state.bot.data = None
-            data = st.session_state.bot.load_data()
-            if data is not None:
-                processed_data = st.session_state.bot.process_data()
-                if processed_data is not None:
-                    st.success(f"Successfully loaded {len(processed_data)} records!")
-                else:
-                    st.error("Failed to process data")
-            else:
-                st.error("No data was loaded. Please check if there are Excel files in the data directory.")
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        import traceback
-        st.text(traceback.format_exc())
-    
-    st.session_state.last_query = ""
-    st.session_state.results = None
-    st.session_state.quick_question = ""  # Store the quick question separately
-
-# Sidebar with quick questions
-with st.sidebar:
-    st.markdown("""
-    <style>
+        
+        /* Sidebar quick questions */
         .quick-question-btn {
             margin-bottom: 8px;
             width: 100%;
@@ -99,56 +69,7 @@ with st.sidebar:
             margin-right: 8px;
             font-size: 1.1em;
         }
-    </style>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("## 💡 Quick Questions")
-    st.markdown("<div style='margin-bottom: 16px; color: #666;'>Click any question to search:</div>", unsafe_allow_html=True)
-    
-    # Define quick questions matching the reference image
-    quick_questions = [
-        {"icon": "💰", "text": "Show me procedures under CHF 5,000", "query": "amount < 5000"},
-        {"icon": "⚠️", "text": "Show procedures requiring authorization", "query": "authorization required"},
-        {"icon": "📅", "text": "Show procedures updated this month", "query": "valid_after 01/05/2024"},
-        {"icon": "🏥", "text": "Show most common procedures", "query": "sort:frequency"}
-    ]
-    
-    # Create styled buttons for each quick question
-    for i, q in enumerate(quick_questions):
-        if st.button(
-            f"{q['icon']} {q['text']}",
-            key=f"qq_{i}",
-            help=f"Search: {q['query']}",
-            use_container_width=True,
-            type="secondary"
-        ):
-            # Store the query and trigger search
-            st.session_state.last_query = q['query']
-            st.session_state.search_clicked = True
-            st.rerun()
-    
-    # Add divider and about section
-    st.markdown("---")
-    with st.expander("ℹ️ About this tool", expanded=False):
-        st.markdown("""
-        This portal helps you find reimbursement information for hospital procedures.
         
-        **Features:**
-        - Search by procedure name, code, or amount
-        - Filter by department or requirements
-        - View detailed documentation needs
-        - Check for special requirements
-        
-        Data is updated monthly from official sources.
-        """)
-        
-        # Add a small footer
-        st.markdown("---")
-        st.caption("v1.0.0 • Last updated: May 2024")
-
-# Add custom CSS for the entire app
-st.markdown("""
-    <style>
         /* Base styles */
         .main {
             background-color: #f8f9fa;
@@ -287,78 +208,197 @@ st.markdown("""
             font-size: 0.85rem;
             font-weight: 500;
         }
+        
+        /* Better mobile responsiveness */
+        /* Main container padding */
+        .main .block-container {
+            padding-top: 2rem;
+            padding-bottom: 2rem;
+        }
+        /* Better spacing for mobile */
+        @media (max-width: 768px) {
+            .stButton>button {
+                width: 100%;
+                margin: 5px 0;
+            }
+            .stTextInput>div>div>input {
+                font-size: 16px !important; /* Fix for iOS zoom */
+            }
+        }
+        /* Highlight amount boxes */
+        .stMetric {
+            border: 1px solid #e0e0e0;
+            border-radius: 8px;
+            padding: 10px;
+            background-color: #f8f9fa;
+            text-align: center;
+        }
+        .stMetric [data-testid="stMetricValue"] {
+            font-size: 1.2rem;
+            font-weight: bold;
+            color: #1f77b4;
+        }
+        /* Better expander styling */
+        .streamlit-expanderHeader {
+            font-size: 1.1rem;
+            font-weight: 600;
+        }
     </style>
-""", unsafe_allow_html=True)
 
-# Font Awesome Icons
-st.markdown('''
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-''', unsafe_allow_html=True)
+"""
+st.markdown(_CSS, unsafe_allow_html=True)
 
-# Main content
-st.markdown("<h1 class='main-header'><i class='fas fa-hospital me-2'></i>Hospital Reimbursement Query Portal</h1>", unsafe_allow_html=True)
+@st.cache_resource(show_spinner="Loading reimbursement data...")
+def get_bot() -> HospitalReimbursementBot:
+    """Load and process the reimbursement data once, shared by all sessions."""
+    bot = HospitalReimbursementBot(data_folder='data')
+    if bot.load_data() is not None:
+        bot.process_data()
+    return bot
+
+# Columns rendered by display_results; search results are limited to these
+DISPLAY_COLUMNS = (
+    'Procedure', 'Code', 'SectionReference', 'ValidFrom', 'ValidUntil',
+    'Amount', 'DocumentationList', 'Exceptions'
+)
 
-# Search functionality
-if 'search_clicked' not in st.session_state:
-    st.session_state.search_clicked = False
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_search(_bot: HospitalReimbursementBot, query: str, threshold: int = 60, top_n: int = 10):
+    """Run a fuzzy search, memoized on the query text and search parameters."""
+    return _bot.search(
+        query=query,
+        use_fuzzy=True,
+        threshold=threshold,
+        top_n=top_n,
+        columns=list(DISPLAY_COLUMNS)
+    )
 
-# Process quick question if present
-if 'quick_question' in st.session_state and st.session_state.quick_question:
-    query = st.session_state.quick_question
-    st.session_state.last_query = query
-    st.session_state.search_clicked = True
-    # Clear it after processing to prevent re-triggering
-    del st.session_state.quick_question
+# Initialize session state
+try:
+    bot = get_bot()
+    if bot.data is None or bot.data.empty:
+        # Don't keep a failed load cached; the next run tries again
+        get_bot.clear()
+        st.error("No data was loaded. Please check if there are Excel files in the data directory.")
+except Exception as e:
+    st.error(f"Error loading data: {str(e)}")
+    import traceback
+    st.text(traceback.format_exc())
+    st.stop()
+
+if 'last_query' not in st.session_state:
+    st.session_state.last_query = ""
+    st.session_state.search_input = ""
+    st.session_state.results = None
 
-# Main search form
-with st.form("search_form"):
-    # Create two columns for the search box and button
-    col1, col2 = st.columns([4, 1])
+# Sidebar with quick questions
+with st.sidebar:
+    st.markdown("## 💡 Quick Questions")
+    st.markdown("<div style='margin-bottom: 16px; color: #666;'>Click any question to search:</div>", unsafe_allow_html=True)
     
-    with col1:
-        # Use the last query if available, otherwise empty
-        default_query = st.session_state.get('last_query', '')
-        query = st.text_input(
-            "Search for procedures, codes, or amounts:",
-            value=default_query,
-            placeholder="e.g., knee replacement, 27447, >5000",
-            label_visibility="collapsed",
-            key="search_input"
-        )
+    # Define quick questions matching the reference image
+    quick_questions = [
+        {"icon": "💰", "text": "Show me procedures under CHF 5,000", "query": "amount < 5000"},
+        {"icon": "⚠️", "text": "Show procedures requiring authorization", "query": "authorization required"},
+        {"icon": "📅", "text": "Show procedures updated this month", "query": "valid_after 01/05/2024"},
+        {"icon": "🏥", "text": "Show most common procedures", "query": "sort:frequency"}
+    ]
     
-    with col2:
-        st.markdown("<div style='height: 29px; display: flex; align-items: flex-end;'>", unsafe_allow_html=True)
-        search_clicked = st.form_submit_button("Search", use_container_width=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+    # Create styled buttons for each quick question
+    for i, q in enumerate(quick_questions):
+        if st.button(
+            f"{q['icon']} {q['text']}",
+            key=f"qq_{i}",
+            help=f"Search: {q['query']}",
+            use_container_width=True,
+            type="secondary"
+        ):
+            # Fill the search box and queue the query; the panel below runs it in this same run
+            st.session_state.search_input = q['query']
+            st.session_state.pending_query = q['query']
     
-    # Check if search was clicked or if we have a search triggered from quick question
-    if search_clicked or st.session_state.get('search_clicked'):
-        if st.session_state.get('last_query'):
-            with st.spinner("Searching..."):
-                # Store the search time
-                st.session_state.search_time = datetime.now()
-                
-                try:
-                    # Perform the search
-                    results, total_matches = st.session_state.bot.search(
-                        query=st.session_state.last_query,
-                        use_fuzzy=True,
-                        threshold=60,
-                        top_n=10
-                    )
-                    
-                    # Store results in session state
-                    st.session_state.results = results
-                    st.session_state.total_matches = total_matches
-                    
-                except Exception as e:
-                    st.error(f"An error occurred during search: {str(e)}")
-                finally:
-                    # Reset the search_clicked flag
-                    if 'search_clicked' in st.session_state:
-                        del st.session_state['search_clicked']
-        else:
-            st.warning("Please enter a search term")
+    # Add divider and about section
+    st.markdown("---")
+    with st.expander("ℹ️ About this tool", expanded=False):
+        st.markdown("""
+        This portal helps you find reimbursement information for hospital procedures.
+        
+        **Features:**
+        - Search by procedure name, code, or amount
+        - Filter by department or requirements
+        - View detailed documentation needs
+        - Check for special requirements
+        
+        Data is updated monthly from official sources.
+        """)
+        
+        # Add a small footer
+        st.markdown("---")
+        st.caption("v1.0.0 • Last updated: May 2024")
+
+
+# Main content
+st.markdown("<h1 class='main-header'><i class='fas fa-hospital me-2'></i>Hospital Reimbursement Query Portal</h1>", unsafe_allow_html=True)
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Return a column, or an all-missing Series if the results don't have it."""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def _format_dates(values: pd.Series) -> pd.Series:
+    """Format a column of dates as dd/mm/YYYY, using 'N/A' for missing or unparseable values."""
+    # Parse each distinct value on its own, so a column mixing date formats keeps all valid dates
+    values = values.astype(object)
+    parsed = {value: pd.to_datetime(value, errors='coerce', dayfirst=True) for value in values.dropna().unique()}
+    dates = pd.to_datetime(values.map(parsed), errors='coerce')
+    return dates.dt.strftime('%d/%m/%Y').fillna('N/A')
+
+def _build_card(card) -> str:
+    """Build the HTML card for one row (namedtuple) of precomputed display fields."""
+    return textwrap.dedent(f"""
+    <div class='procedure-card'>
+        <div style='display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 12px;'>
+            <div>
+                <div style='font-size: 1.25rem; font-weight: 600; color: #1a237e; margin-bottom: 4px;'>
+                    {card.Procedure}
+                </div>
+                <div style='display: flex; align-items: center; gap: 12px; margin-bottom: 8px;'>
+                    <span style='background: #e3f2fd; color: #0d47a1; padding: 2px 8px; border-radius: 12px; font-size: 0.85rem;'>
+                        {card.Code}
+                    </span>
+                    <span style='color: #666; font-size: 0.9rem;'>
+                        <i class='far fa-file-alt' style='margin-right: 4px;'></i>
+                        {card.SectionReference}
+                    </span>
+                </div>
+                <div style='color: #666; font-size: 0.9rem; margin-bottom: 8px;'>
+                    <i class='far fa-calendar-alt' style='margin-right: 4px;'></i>
+                    Valid: {card.ValidFrom} - {card.ValidUntil}
+                </div>
+            </div>
+            <div style='background: #f5f9ff; border-radius: 8px; padding: 12px 16px; text-align: right; min-width: 120px;'>
+                <div style='font-size: 0.85rem; color: #666;'>Amount</div>
+                <div style='font-size: 1.5rem; font-weight: 700; color: #1a73e8;'>
+                    CHF {card.Amount}
+                </div>
+            </div>
+        </div>
+        
+        <div style='margin: 16px 0;'>
+            <div style='font-weight: 600; color: #444; margin-bottom: 8px;'>
+                <i class='fas fa-file-medical' style='margin-right: 6px; color: #1a73e8;'></i>
+                Documentation Requirements:
+            </div>
+            <ul style='margin: 8px 0 0 0; padding-left: 24px; color: #444;'>
+                {card.DocsHtml}
+            </ul>
+        </div>
+        
+        {card.ExceptionsHtml}
+    </div>
+    """).strip()
 
 # Display results
 def display_results(results: pd.DataFrame, query: str):
@@ -378,96 +418,113 @@ def display_results(results: pd.DataFrame, query: str):
     </div>
     """, unsafe_allow_html=True)
     
-    # Display each result as a card
-    for _, row in results.iterrows():
-        # Format amount with thousand separators and 2 decimal places
-        amount = f"{float(row.get('Amount', 0)):,.2f}" if pd.notna(row.get('Amount')) else "N/A"
+    # Large result sets are quicker to scan in the native (virtualized) table
+    view = st.radio("View", ["Cards", "Table"], horizontal=True, key="results_view")
+    if view == "Table":
+        display_cols = [col for col in DISPLAY_COLUMNS if col in results.columns]
+        table = results[display_cols].copy()
+        if 'Amount' in table.columns:
+            table['Amount'] = pd.to_numeric(table['Amount'], errors='coerce')
+        st.dataframe(
+            table,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'Amount': st.column_config.NumberColumn(format='CHF %.2f'),
+                'DocumentationList': st.column_config.ListColumn('Documentation'),
+            },
+        )
+        return
+    
+    # Reuse the cards already rendered for this query on an earlier run
+    if st.session_state.get('results_html_key') == query:
+        st.markdown(st.session_state.results_html, unsafe_allow_html=True)
+        return
+    
+    # Format display fields once for the whole result set
+    docs_html = _column(results, 'DocumentationList').map(
+        lambda docs: " ".join(
+            f'<li style="margin-bottom: 6px;">{doc}</li>' for doc in docs
+        ) if isinstance(docs, list) else ''
+    )
+    exceptions = _column(results, 'Exceptions')
+    has_exceptions = exceptions.notna() & ~exceptions.astype(str).str.strip().str.lower().isin(['', 'nan'])
+    exceptions_html = (
+        "<div style='background: #fff8e1; border-left: 4px solid #ffc107; padding: 12px; margin: 12px 0; border-radius: 0 4px 4px 0;'>"
+        "<div style='font-weight: 600; color: #e6a700; margin-bottom: 4px;'>"
+        "<i class='fas fa-exclamation-triangle' style='margin-right: 6px;'></i>Important Note:</div>"
+        "<div style='color: #5d4037;'>" + exceptions.astype(str) + "</div></div>"
+    ).where(has_exceptions, '')
+    
+    formatted = pd.DataFrame({
+        'Procedure': _column(results, 'Procedure').fillna('N/A'),
+        'Code': _column(results, 'Code').fillna('N/A'),
+        'SectionReference': _column(results, 'SectionReference').fillna('N/A'),
+        'Amount': pd.to_numeric(_column(results, 'Amount'), errors='coerce').map(
+            lambda v: f"{v:,.2f}" if pd.notna(v) else "N/A"
+        ),
+        'ValidFrom': _format_dates(_column(results, 'ValidFrom')),
+        'ValidUntil': _format_dates(_column(results, 'ValidUntil')),
+        'DocsHtml': docs_html.mask(docs_html == '', '<li>No specific documentation required</li>'),
+        'ExceptionsHtml': exceptions_html,
+    })
+    
+    # Render all cards in a single markdown call, with a subtle divider between them
+    divider = "<div style='height: 1px; background: #f0f0f0; margin: 1.5rem 0;'></div>"
+    html = f"\n\n{divider}\n\n".join(_build_card(card) for card in formatted.itertuples(index=False))
+    st.markdown(html, unsafe_allow_html=True)
+    
+    st.session_state.results_html = html
+    st.session_state.results_html_key = query
+
+@st.fragment
+def search_panel():
+    """Search form and results, rerun on their own when the form is submitted."""
+    # Main search form
+    with st.form("search_form"):
+        # Create two columns for the search box and button
+        col1, col2 = st.columns([4, 1])
         
-        # Format validity dates
-        valid_from = pd.to_datetime(row.get('ValidFrom', '')).strftime('%d/%m/%Y') if pd.notna(row.get('ValidFrom')) else 'N/A'
-        valid_until = pd.to_datetime(row.get('ValidUntil', '')).strftime('%d/%m/%Y') if pd.notna(row.get('ValidUntil')) else 'N/A'
+        with col1:
+            # The box keeps its value in session state under its key, which quick questions also write
+            query = st.text_input(
+                "Search for procedures, codes, or amounts:",
+                placeholder="e.g., knee replacement, 27447, >5000",
+                label_visibility="collapsed",
+                key="search_input"
+            )
         
-        # Get documentation items
-        docs = []
-        if pd.notna(row.get('Documentation')):
-            doc_text = str(row['Documentation'])
-            docs = [d.strip() for d in doc_text.split('\n') if d.strip()]
+        with col2:
+            st.markdown("<div style='height: 29px; display: flex; align-items: flex-end;'>", unsafe_allow_html=True)
+            search_clicked = st.form_submit_button("Search", use_container_width=True)
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        # Get exceptions
-        exceptions = row.get('Exceptions', '')
+        # Quick questions and the form both queue a pending query, handled once here
+        if search_clicked:
+            st.session_state.pending_query = query.strip()
+        pending_query = st.session_state.pop('pending_query', None)
         
-        # Create the card
-        with st.container():
-            st.markdown("""
-            <div class='procedure-card'>
-                <div style='display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 12px;'>
-                    <div>
-                        <div style='font-size: 1.25rem; font-weight: 600; color: #1a237e; margin-bottom: 4px;'>
-                            {procedure}
-                        </div>
-                        <div style='display: flex; align-items: center; gap: 12px; margin-bottom: 8px;'>
-                            <span style='background: #e3f2fd; color: #0d47a1; padding: 2px 8px; border-radius: 12px; font-size: 0.85rem;'>
-                                {code}
-                            </span>
-                            <span style='color: #666; font-size: 0.9rem;'>
-                                <i class='far fa-file-alt' style='margin-right: 4px;'></i>
-                                {section_ref}
-                            </span>
-                        </div>
-                        <div style='color: #666; font-size: 0.9rem; margin-bottom: 8px;'>
-                            <i class='far fa-calendar-alt' style='margin-right: 4px;'></i>
-                            Valid: {valid_from} - {valid_until}
-                        </div>
-                    </div>
-                    <div style='background: #f5f9ff; border-radius: 8px; padding: 12px 16px; text-align: right; min-width: 120px;'>
-                        <div style='font-size: 0.85rem; color: #666;'>Amount</div>
-                        <div style='font-size: 1.5rem; font-weight: 700; color: #1a73e8;'>
-                            CHF {amount}
-                        </div>
-                    </div>
-                </div>
-                
-                {documentation_section}
-                
-                {exceptions_section}
-            </div>
-            """.format(
-                procedure=row.get('Procedure', 'N/A'),
-                code=row.get('Code', 'N/A'),
-                section_ref=row.get('SectionReference', 'N/A'),
-                valid_from=valid_from,
-                valid_until=valid_until,
-                amount=amount,
-                documentation_section=f"""
-                <div style='margin: 16px 0;'>
-                    <div style='font-weight: 600; color: #444; margin-bottom: 8px;'>
-                        <i class='fas fa-file-medical' style='margin-right: 6px; color: #1a73e8;'></i>
-                        Documentation Requirements:
-                    </div>
-                    <ul style='margin: 8px 0 0 0; padding-left: 24px; color: #444;'>
-                        {" ".join([f'<li style="margin-bottom: 6px;">{doc}</li>' for doc in docs]) if docs else '<li>No specific documentation required</li>'}
-                    </ul>
-                </div>
-                """,
-                exceptions_section=f"""
-                {f'''
-                <div style='background: #fff8e1; border-left: 4px solid #ffc107; padding: 12px; margin: 12px 0; border-radius: 0 4px 4px 0;'>
-                    <div style='font-weight: 600; color: #e6a700; margin-bottom: 4px;'>
-                        <i class='fas fa-exclamation-triangle' style='margin-right: 6px;'></i>
-                        Important Note:
-                    </div>
-                    <div style='color: #5d4037;'>{exceptions}</div>
-                </div>
-                ''' if pd.notna(exceptions) and str(exceptions).strip().lower() not in ['', 'nan'] else ''}
-                """
-            ), unsafe_allow_html=True)
-            
-            # Add a subtle divider between cards (but not after the last one)
-            if _ < len(results) - 1:
-                st.markdown("<div style='height: 1px; background: #f0f0f0; margin: 1.5rem 0;'></div>", unsafe_allow_html=True)
+        if pending_query is not None:
+            if not pending_query:
+                st.warning("Please enter a search term")
+            else:
+                with st.spinner("Searching..."):
+                    try:
+                        # Perform the search
+                        results, total_matches = run_search(bot, pending_query)
+                        
+                        # Store results in session state
+                        st.session_state.results = results
+                        st.session_state.total_matches = total_matches
+                        st.session_state.last_query = pending_query
+                        
+                    except Exception as e:
+                        st.error(f"An error occurred during search: {str(e)}")
+        
+    if 'results' in st.session_state and st.session_state.results is not None:
+        display_results(st.session_state.results, st.session_state.last_query)
 
-if 'results' in st.session_state and st.session_state.results is not None:
-    display_results(st.session_state.results, st.session_state.last_query)
+search_panel()
 
 # Add some space at the bottom
 st.markdown("<br><br>", unsafe_allow_html=True)
@@ -479,42 +536,3 @@ st.markdown("""
 This portal helps you search and find reimbursement information for hospital procedures.
 For assistance, please contact the billing department.
 """)
-
-# Custom CSS for better mobile responsiveness
-st.markdown("""
-    <style>
-        /* Main container padding */
-        .main .block-container {
-            padding-top: 2rem;
-            padding-bottom: 2rem;
-        }
-        /* Better spacing for mobile */
-        @media (max-width: 768px) {
-            .stButton>button {
-                width: 100%;
-                margin: 5px 0;
-            }
-            .stTextInput>div>div>input {
-                font-size: 16px !important; /* Fix for iOS zoom */
-            }
-        }
-        /* Highlight amount boxes */
-        .stMetric {
-            border: 1px solid #e0e0e0;
-            border-radius: 8px;
-            padding: 10px;
-            background-color: #f8f9fa;
-            text-align: center;
-        }
-        .stMetric [data-testid="stMetricValue"] {
-            font-size: 1.2rem;
-            font-weight: bold;
-            color: #1f77b4;
-        }
-        /* Better expander styling */
-        .streamlit-expanderHeader {
-            font-size: 1.1rem;
-            font-weight: 600;
-        }
-    </style>
-""", unsafe_allow_html=True)
@@ -1,12 +1,157 @@
 import os
 import re
+import logging
+import json
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from pathlib import Path
+from types import MappingProxyType
 from typing import List, Dict, Optional, Union, Tuple
 import numpy as np
-from fuzzywuzzy import fuzz
+import pyarrow as pa
+import pyarrow.compute as pc
+from rapidfuzz import fuzz, process, utils
 from dataclasses import dataclass
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+log = logging.getLogger(__name__)
+
+# Columns returned by HospitalReimbursementBot.search unless others are requested
+DEFAULT_RESULT_COLUMNS = ['Procedure', 'Code', 'Amount', 'SourceFile']
+
+# Dtypes treated as text when building and searching SearchableText
+TEXT_DTYPES = ['object', 'string', 'category']
+
+# Low-cardinality columns stored as categoricals
+CATEGORY_COLUMNS = ['SourceFile', 'Code']
+
+# Arrow-backed string dtype used for text columns, so string methods run in Arrow kernels
+STRING_DTYPE = 'string[pyarrow]'
+
+# Sub-folder of the data folder holding Parquet copies of the Excel files
+PARQUET_CACHE_DIR = '.cache'
+# Combined data of all files in the Parquet cache folder, and the file listing it was built from
+COMBINED_CACHE_FILE = 'combined.parquet'
+COMBINED_MANIFEST_FILE = 'combined.manifest.json'
+
+# Standard names for the column headers found in the source files (case-insensitive)
+COLUMN_MAPPING = MappingProxyType({
+    # Procedure related
+    'procedure': 'Procedure',
+    'proc': 'Procedure',
+    'procedure_name': 'Procedure',
+    'name': 'Procedure',
+    'description': 'Procedure',
+    
+    # Code related
+    'code': 'Code',
+    'cpt': 'Code',
+    'cpt_code': 'Code',
+    'procedure_code': 'Code',
+    
+    # Amount related
+    'amount': 'Amount',
+    'price': 'Amount',
+    'cost': 'Amount',
+    'reimbursement': 'Amount',
+    'charge': 'Amount',
+    
+    # Category/Type
+    'category': 'Category',
+    'type': 'Category',
+    'department': 'Category',
+    
+    # Date related
+    'date': 'Date',
+    'service_date': 'Date',
+    'procedure_date': 'Date'
+})
+
+# Characters stripped from column names
+BAD_CHARS_RE = re.compile(r'[^\w\s]')
+
+# Values used for result columns that are missing from the data
+RESULT_DEFAULTS = {
+    'Procedure': 'N/A',
+    'Code': 'N/A',
+    'Amount': 0,
+    'SourceFile': 'Unknown',
+}
+
+# Structured queries answered with column filters instead of text matching
+AMOUNT_QUERY = re.compile(r'^amount\s*([<>]=?)\s*(\d+(?:\.\d+)?)$')
+VALID_AFTER_QUERY = re.compile(r'^valid_after\s+(\d\d/\d\d/\d\d\d\d)$')
+SORT_QUERY = re.compile(r'^sort:(\w+)$')
+AUTHORIZATION_QUERY = 'authorization required'
+# Queries shaped like a procedure code, looked up directly in the code index
+CODE_QUERY = re.compile(r'[A-Z0-9]{3,7}')
+
+def parse_structured(query: str) -> Optional[Tuple]:
+    """
+    Recognise the structured quick-filter queries.
+    
+    Args:
+        query: Search query as typed by the user
+        
+    Returns:
+        Optional[Tuple]: ('amount', operator, value), ('valid_after', date),
+        ('sort', key) or ('authorization',), or None for a free-text query
+    """
+    query = query.strip().lower()
+    
+    match = AMOUNT_QUERY.match(query)
+    if match:
+        return 'amount', match.group(1), float(match.group(2))
+    
+    match = VALID_AFTER_QUERY.match(query)
+    if match:
+        date = pd.to_datetime(match.group(1), format='%d/%m/%Y', errors='coerce')
+        return None if pd.isna(date) else ('valid_after', date)
+    
+    match = SORT_QUERY.match(query)
+    if match:
+        return 'sort', match.group(1)
+    
+    if query == AUTHORIZATION_QUERY:
+        return ('authorization',)
+    
+    return None
+
+def _read_all_sheets(file: Path) -> Optional[pd.DataFrame]:
+    """
+    Read and combine all sheets of an Excel file.
+    
+    Module-level so it can run in a worker process.
+    
+    Args:
+        file: Path to the Excel file
+        
+    Returns:
+        Optional[pd.DataFrame]: Combined sheets with a SourceFile column, or None if all are empty
+    """
+    sheets = []
+    with pd.ExcelFile(file) as xls:
+        for sheet_name in xls.sheet_names:
+            try:
+                df = pd.read_excel(xls, sheet_name=sheet_name)
+                if not df.empty:
+                    # Add source file info
+                    df['SourceFile'] = file.name
+                    sheets.append(df)
+            except Exception as e:
+                print(f"[WARNING] Could not read sheet '{sheet_name}' from {file.name}: {str(e)}")
+                continue
+    
+    if not sheets:
+        return None
+    
+    # Parquet needs a single type per column, so store mixed values as strings
+    df = pd.concat(sheets, ignore_index=True, sort=False)
+    for col in df.select_dtypes(include=['object']).columns:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
 
 @dataclass
 class SearchResult:
@@ -38,6 +183,18 @@ class HospitalReimbursementBot:
         """
         self.data_folder = Path(data_folder)
         self.data = None
+        # Normalized distinct text per column, scored in one batch by fuzzy search
+        self._choices = None
+        # Row positions from most to least frequent, for sort:frequency
+        self._by_frequency = None
+        # Lowercased searchable text as one Arrow array, scanned by exact search
+        self._text_array = None
+        # Source text columns of the data, resolved once per load
+        self._text_columns = None
+        # Upper-cased Code to the row positions carrying it, for direct code lookups
+        self._code_index = None
+        # Recent search results, cleared whenever the data changes
+        self._search_cached = lru_cache(maxsize=128)(self._search)
 
     def _standardize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -55,81 +212,154 @@ class HospitalReimbursementBot:
         # Create a copy to avoid modifying the original
         df = df.copy()
         
-        # Standardize column names (case-insensitive)
-        column_mapping = {
-            # Procedure related
-            'procedure': 'Procedure',
-            'proc': 'Procedure',
-            'procedure_name': 'Procedure',
-            'name': 'Procedure',
-            'description': 'Procedure',
-            
-            # Code related
-            'code': 'Code',
-            'cpt': 'Code',
-            'cpt_code': 'Code',
-            'procedure_code': 'Code',
-            
-            # Amount related
-            'amount': 'Amount',
-            'price': 'Amount',
-            'cost': 'Amount',
-            'reimbursement': 'Amount',
-            'charge': 'Amount',
-            
-            # Category/Type
-            'category': 'Category',
-            'type': 'Category',
-            'department': 'Category',
-            
-            # Date related
-            'date': 'Date',
-            'service_date': 'Date',
-            'procedure_date': 'Date'
-        }
-        
-        # Apply column name standardization
-        df.columns = [str(col).strip() for col in df.columns]
-        df = df.rename(columns=lambda x: column_mapping.get(x.lower(), x))
-        
-        # Convert column names to Title Case and remove special characters
-        df.columns = [re.sub(r'[^\w\s]', '', str(col)).strip().title().replace(' ', '') 
-                     for col in df.columns]
+        # Standardize column names (case-insensitive) in a single pass
+        df.columns = [
+            BAD_CHARS_RE.sub('', COLUMN_MAPPING.get(str(col).strip().lower(), str(col).strip()))
+            .strip().title().replace(' ', '')
+            for col in df.columns
+        ]
         
         # Handle missing values
-        for col in df.select_dtypes(include=['object']).columns:
-            df[col] = df[col].fillna('').astype(str).str.strip()
+        for col in df.select_dtypes(include=TEXT_DTYPES).columns:
+            # Arrow's strip skips nulls, so fill them only once at the end
+            df[col] = df[col].astype(STRING_DTYPE).str.strip().fillna('')
             
-        for col in df.select_dtypes(include=[np.number]).columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Numeric columns already hold numbers; only a text Amount needs converting
+        if 'Amount' in df.columns and not is_numeric_dtype(df['Amount']):
+            df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
             
         # Ensure required columns exist
         for col in ['Procedure', 'Code', 'Amount']:
             if col not in df.columns:
                 df[col] = np.nan
+        
+        df['Code'] = df['Code'].astype('category')
                 
         return df
     
-    def _create_searchable_text(self, df: pd.DataFrame) -> pd.Series:
+    def _get_text_columns(self) -> List[str]:
+        """
+        Get the source text columns of the data, looking them up on first use.
+        
+        Returns:
+            List[str]: Text columns, excluding SearchableText and other derived columns
+        """
+        if self._text_columns is None:
+            self._text_columns = [
+                col for col in self.data.select_dtypes(include=TEXT_DTYPES).columns
+                if col not in ('SearchableText', 'DocumentationList') and not str(col).startswith('_')
+            ]
+        return self._text_columns
+    
+    def _create_searchable_text(self, df: pd.DataFrame, text_columns: Optional[List[str]] = None) -> pd.Series:
         """
         Create a searchable text column by combining all text columns.
         
         Args:
             df: Input DataFrame
+            text_columns: Columns to combine. Defaults to all text columns of df.
             
         Returns:
             pd.Series: Series containing combined searchable text
         """
         # Select text columns (excluding binary and numeric types)
-        text_columns = df.select_dtypes(include=['object']).columns
+        if text_columns is None:
+            text_columns = df.select_dtypes(include=TEXT_DTYPES).columns
         
-        # Combine all text columns into a single searchable string
-        searchable = df[text_columns].apply(
-            lambda x: ' | '.join(x.dropna().astype(str)),
-            axis=1
-        )
+        if not len(text_columns):
+            return pd.Series('', index=df.index, dtype=STRING_DTYPE)
+        
+        # Combine all text columns into a single searchable string in one str.cat call,
+        # prefixing each present value with the separator so missing values leave no gap
+        pieces = [(' | ' + df[col].astype(STRING_DTYPE)).fillna('') for col in text_columns]
+        searchable = pieces[0].str.cat(pieces[1:])
+        
+        return searchable.str.slice(len(' | '))
+    
+    def _read_file_cache(self, file: Path) -> Optional[pd.DataFrame]:
+        """
+        Load the Parquet copy of an Excel file if it is at least as new as the file.
+        
+        Args:
+            file: Path to the Excel file
+            
+        Returns:
+            Optional[pd.DataFrame]: Cached sheets of the file, or None if missing or stale
+        """
+        cache_file = self.data_folder / PARQUET_CACHE_DIR / f"{file.name}.parquet"
+        if cache_file.exists() and cache_file.stat().st_mtime >= file.stat().st_mtime:
+            try:
+                return pd.read_parquet(cache_file)
+            except Exception as e:
+                print(f"[WARNING] Could not read Parquet cache for {file.name}: {str(e)}")
+        return None
+    
+    def _write_file_cache(self, file: Path, df: pd.DataFrame) -> None:
+        """
+        Save the combined sheets of an Excel file to the Parquet cache folder.
+        
+        Args:
+            file: Path to the Excel file
+            df: Combined sheets of the file
+        """
+        cache_file = self.data_folder / PARQUET_CACHE_DIR / f"{file.name}.parquet"
+        try:
+            cache_file.parent.mkdir(exist_ok=True)
+            df.to_parquet(cache_file, index=False)
+        except Exception as e:
+            print(f"[WARNING] Could not write Parquet cache for {file.name}: {str(e)}")
+    
+    def _data_manifest(self, files: List[Path]) -> List[List]:
+        """
+        Describe the data files so a change to any of them can be detected.
         
-        return searchable
+        Args:
+            files: Data files that make up the combined data
+            
+        Returns:
+            List[List]: [name, mtime in ns, size] for each file, sorted by name
+        """
+        return sorted([file.name, file.stat().st_mtime_ns, file.stat().st_size] for file in files)
+    
+    def _read_combined_cache(self, manifest: List[List]) -> Optional[pd.DataFrame]:
+        """
+        Load the combined data from the Parquet cache if it matches the data files.
+        
+        Args:
+            manifest: Manifest of the current data files
+            
+        Returns:
+            Optional[pd.DataFrame]: Cached combined data, or None if missing or stale
+        """
+        cache_dir = self.data_folder / PARQUET_CACHE_DIR
+        manifest_file = cache_dir / COMBINED_MANIFEST_FILE
+        cache_file = cache_dir / COMBINED_CACHE_FILE
+        if not (manifest_file.exists() and cache_file.exists()):
+            return None
+        
+        try:
+            if json.loads(manifest_file.read_text()) != manifest:
+                return None
+            return pd.read_parquet(cache_file)
+        except Exception as e:
+            print(f"[WARNING] Could not read combined Parquet cache: {str(e)}")
+            return None
+    
+    def _write_combined_cache(self, manifest: List[List]) -> None:
+        """
+        Save the combined data and its manifest to the Parquet cache folder.
+        
+        Args:
+            manifest: Manifest of the data files the combined data was built from
+        """
+        cache_dir = self.data_folder / PARQUET_CACHE_DIR
+        try:
+            cache_dir.mkdir(exist_ok=True)
+            self.data.to_parquet(cache_dir / COMBINED_CACHE_FILE, index=False)
+            # Written last, so an interrupted write leaves no matching manifest
+            (cache_dir / COMBINED_MANIFEST_FILE).write_text(json.dumps(manifest))
+        except Exception as e:
+            print(f"[WARNING] Could not write combined Parquet cache: {str(e)}")
     
     def load_data(self) -> Optional[pd.DataFrame]:
         """
@@ -157,40 +387,60 @@ class HospitalReimbursementBot:
         if not excel_files:
             print("[ERROR] No Excel files found in the data folder")
             return None
-            
-        all_data = []
-        for file in excel_files:
-            try:
-                # Skip sample file if it exists
-                if file.name == "sample_validation_data.xlsx":
-                    continue
-                    
-                # Read all sheets
-                xls = pd.ExcelFile(file)
-                for sheet_name in xls.sheet_names:
+        
+        self._choices = None
+        self._by_frequency = None
+        self._text_array = None
+        self._text_columns = None
+        self._code_index = None
+        self._search_cached.cache_clear()
+        
+        # Skip sample file if it exists
+        data_files = [file for file in excel_files if file.name != "sample_validation_data.xlsx"]
+        
+        # Reuse the combined data from the last run if no file has changed since
+        manifest = self._data_manifest(data_files)
+        cached = self._read_combined_cache(manifest)
+        if cached is not None:
+            self.data = cached
+            print(f"\033[92m[SUCCESS]\033[0m Loaded {len(self.data)} total records from cache")
+            return self.data
+        
+        # Use each file's Parquet copy where it is current, and parse the rest in parallel
+        loaded = {file: self._read_file_cache(file) for file in data_files}
+        to_parse = [file for file, df in loaded.items() if df is None]
+        if to_parse:
+            with ProcessPoolExecutor(max_workers=min(len(to_parse), os.cpu_count() or 1)) as executor:
+                futures = {file: executor.submit(_read_all_sheets, file) for file in to_parse}
+                for file, future in futures.items():
                     try:
-                        df = pd.read_excel(file, sheet_name=sheet_name)
-                        if not df.empty:
-                            # Add source file info
-                            df['SourceFile'] = file.name
-                            all_data.append(df)
+                        loaded[file] = future.result()
                     except Exception as e:
-                        print(f"[WARNING] Could not read sheet '{sheet_name}' from {file.name}: {str(e)}")
+                        print(f"[ERROR] Loading {file.name}: {str(e)}")
                         continue
-            except Exception as e:
-                print(f"[ERROR] Loading {file.name}: {str(e)}")
-                continue
+                    if loaded[file] is not None:
+                        self._write_file_cache(file, loaded[file])
+        
+        all_data = [df for df in loaded.values() if df is not None]
         
         if not all_data:
             print("[WARNING] No data was loaded from any files.")
             return None
             
-        # Combine all data into a single DataFrame
-        self.data = pd.concat(all_data, ignore_index=True)
+        # Combine all data into a single DataFrame, aligned to the union of columns up front
+        columns = list(dict.fromkeys(col for df in all_data for col in df.columns))
+        all_data = [df.reindex(columns=columns) for df in all_data]
+        self.data = pd.concat(all_data, ignore_index=True, sort=False)
         
-        # Add searchable text column
+        # Back text columns with Arrow strings, then add searchable text column
         if not self.data.empty:
-            self.data['SearchableText'] = self._create_searchable_text(self.data)
+            text_columns = self._get_text_columns()
+            self.data[text_columns] = self.data[text_columns].astype(STRING_DTYPE)
+            self.data['SearchableText'] = self._create_searchable_text(self.data, text_columns)
+            for col in CATEGORY_COLUMNS:
+                if col in self.data.columns:
+                    self.data[col] = self.data[col].astype('category')
+            self._write_combined_cache(manifest)
         
         total_records = len(self.data)
         print(f"\033[92m[SUCCESS]\033[0m Loaded {total_records} total records from {len(excel_files)} files")
@@ -211,13 +461,19 @@ class HospitalReimbursementBot:
         print(f"Processing {len(self.data)} records...")
         
         # Ensure consistent data types
-        if 'Amount' in self.data.columns:
+        if 'Amount' in self.data.columns and not is_numeric_dtype(self.data['Amount']):
             self.data['Amount'] = pd.to_numeric(self.data['Amount'], errors='coerce')
             
         # Fill any remaining NaN values in key columns
         for col in ['Procedure', 'Code']:
             if col in self.data.columns:
-                self.data[col] = self.data[col].fillna('Unknown')
+                column = self.data[col]
+                if isinstance(column.dtype, pd.CategoricalDtype) and 'Unknown' not in column.cat.categories:
+                    column = column.cat.add_categories('Unknown')
+                self.data[col] = column.fillna('Unknown')
+        
+        # Filling may have turned key columns into text
+        self._text_columns = None
         
         # Remove any completely empty rows
         initial_count = len(self.data)
@@ -225,36 +481,191 @@ class HospitalReimbursementBot:
         if len(self.data) < initial_count:
             print(f"  [INFO] Removed {initial_count - len(self.data)} completely empty rows")
         
+        # Split documentation requirements into a list once, rather than on every display
+        if 'Documentation' in self.data.columns:
+            self.data['DocumentationList'] = (
+                self.data['Documentation'].fillna('').astype(str).str.split('\n')
+                .map(lambda docs: [doc.strip() for doc in docs if doc.strip()])
+            )
+        
+        # Lowercase the combined text once, rather than on every exact search
+        if 'SearchableText' in self.data.columns:
+            # Straight from the column's Arrow data, without a round trip through Python strings
+            self._text_array = pa.array(self.data['SearchableText'].astype(STRING_DTYPE).str.lower().fillna(''))
+        else:
+            self._text_array = None
+        
+        self._choices = self._build_choices()
+        self._by_frequency = self._frequency_order()
+        self._code_index = self._build_code_index()
+        self._search_cached.cache_clear()
+        
         print(f"[DONE] Processing complete. {len(self.data)} records remaining after cleaning.")
         return self.data
         
-    def _calculate_match_score(self, text: str, query: str) -> float:
+    def _scan_text(self, query: str) -> np.ndarray:
         """
-        Calculate a match score between text and query using fuzzy matching.
+        Find the rows whose lowercased searchable text contains the query.
         
         Args:
-            text: Text to search in
-            query: Search query
+            query: Lowercased search term
             
         Returns:
-            float: Match score (0-100)
+            np.ndarray: Positions of the matching rows, in data order
+        """
+        mask = pc.match_substring(self._text_array, query)
+        return np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+    
+    def _build_choices(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Normalize the text to score once for fuzzy search.
+        
+        SearchableText already joins every text column, so it alone is scored when
+        present; otherwise each text column is scored and the best score kept.
+        
+        Returns:
+            Dict[str, Tuple[np.ndarray, np.ndarray]]: Column name to the codes of each
+            row and the distinct strings they refer to. Strings are passed through
+            rapidfuzz's default_process, with missing values as empty strings.
+        """
+        if 'SearchableText' in self.data.columns:
+            text_columns = ['SearchableText']
+        else:
+            text_columns = self._get_text_columns()
+        choices = {}
+        for col in text_columns:
+            normalized = [utils.default_process(text) for text in self.data[col].fillna('').astype(str).tolist()]
+            codes, uniques = pd.factorize(np.array(normalized, dtype=object))
+            choices[col] = (codes, np.asarray(uniques, dtype=object))
+        return choices
+    
+    def _build_code_index(self) -> Dict[str, np.ndarray]:
+        """
+        Map each procedure code to the rows carrying it.
+        
+        Returns:
+            Dict[str, np.ndarray]: Upper-cased code to row positions, without the
+            'Unknown' placeholder used for missing codes
+        """
+        if 'Code' not in self.data.columns:
+            return {}
+        # Codes read as numbers come back as e.g. '27447.0'
+        codes = self.data['Code'].astype(str).str.upper().str.replace(r'\.0$', '', regex=True)
+        return {
+            code: np.asarray(rows)
+            for code, rows in codes.groupby(codes).indices.items()
+            if code != 'UNKNOWN'
+        }
+    
+    def _frequency_order(self) -> Optional[np.ndarray]:
+        """
+        Order the rows from most to least frequent.
+        
+        Returns:
+            Optional[np.ndarray]: Row positions sorted by the Frequency column, or by
+            how often each Code occurs if there is none (missing and 'Unknown' codes
+            count as 0); None without either column
         """
-        if not text or not query:
-            return 0.0
+        if 'Frequency' in self.data.columns:
+            frequency = pd.to_numeric(self.data['Frequency'], errors='coerce')
+        elif 'Code' in self.data.columns:
+            codes = self.data['Code'].astype(str).str.upper().where(self.data['Code'].notna(), 'UNKNOWN')
+            frequency = codes.map(codes.value_counts()).where(codes != 'UNKNOWN')
+        else:
+            return None
+        return np.argsort(-frequency.fillna(0).to_numpy(dtype=float), kind='stable')
+    
+    def _structured_positions(self, structured: Tuple) -> np.ndarray:
+        """
+        Apply a parsed structured query to the loaded data.
+        
+        Args:
+            structured: Query as returned by parse_structured
             
-        # Convert to string and lowercase for case-insensitive comparison
-        text = str(text).lower()
-        query = query.lower()
+        Returns:
+            np.ndarray: Positions of the matching rows, in result order
+        """
+        data = self.data
+        kind = structured[0]
+        no_matches = np.array([], dtype=np.intp)
+        
+        if kind == 'amount':
+            if 'Amount' not in data.columns:
+                return no_matches
+            _, op, value = structured
+            amounts = data['Amount']
+            if not is_numeric_dtype(amounts):
+                amounts = pd.to_numeric(amounts, errors='coerce')
+            compare = {'<': amounts.lt, '<=': amounts.le, '>': amounts.gt, '>=': amounts.ge}[op]
+            return np.flatnonzero(compare(value).to_numpy())
+        
+        if kind == 'valid_after':
+            if 'ValidFrom' not in data.columns:
+                return no_matches
+            valid_from = pd.to_datetime(data['ValidFrom'], errors='coerce', dayfirst=True)
+            return np.flatnonzero((valid_from >= structured[1]).to_numpy())
+        
+        if kind == 'authorization':
+            columns = [col for col in ('Documentation', 'Exceptions') if col in data.columns]
+            if not columns:
+                columns = self._get_text_columns()
+            mask = np.zeros(len(data), dtype=bool)
+            for col in columns:
+                mask |= data[col].astype(str).str.contains('authoriz', case=False, regex=False).to_numpy()
+            return np.flatnonzero(mask)
+        
+        # sort:<key> - 'frequency' uses the order precomputed in process_data
+        key = structured[1]
+        if key == 'frequency':
+            if self._by_frequency is None:
+                self._by_frequency = self._frequency_order()
+            return no_matches if self._by_frequency is None else self._by_frequency
+        columns = {col.lower(): col for col in data.columns}
+        if key in columns:
+            values = data[columns[key]]
+            order = values.sort_values(ascending=False, kind='stable').index
+            return data.index.get_indexer(order)
+        return no_matches
+    
+    def _results_frame(
+        self,
+        rows: np.ndarray,
+        scores: Union[str, np.ndarray],
+        output_columns: List[str]
+    ) -> pd.DataFrame:
+        """
+        Slice the result columns of the matching rows in one step.
         
-        # Use partial ratio for partial matches
-        return fuzz.partial_ratio(text, query)
+        Args:
+            rows: Positions of the matching rows, in result order
+            scores: MatchScore for every row, or one numeric score per row
+            output_columns: Result columns to return, ending with MatchScore
+            
+        Returns:
+            pd.DataFrame: Results, using RESULT_DEFAULTS for columns missing from the data
+        """
+        data_columns = [col for col in output_columns[:-1] if col in self.data.columns]
+        results_df = (
+            self.data.iloc[rows, self.data.columns.get_indexer(data_columns)]
+            .reset_index(drop=True)
+            .reindex(columns=output_columns)
+        )
+        for col in output_columns[:-1]:
+            if col not in self.data.columns and col in RESULT_DEFAULTS:
+                results_df[col] = RESULT_DEFAULTS[col]
+            elif isinstance(results_df[col].dtype, pd.CategoricalDtype):
+                # Hand back plain values, so callers can fill or compare them freely
+                results_df[col] = results_df[col].astype(results_df[col].cat.categories.dtype)
+        results_df['MatchScore'] = scores if isinstance(scores, str) else pd.Series(scores).map('{:.1f}%'.format)
+        return results_df
     
     def search(
         self, 
         query: str, 
         use_fuzzy: bool = False, 
         threshold: int = 70,
-        top_n: int = 5
+        top_n: int = 5,
+        columns: Optional[List[str]] = None
     ) -> Tuple[pd.DataFrame, int]:
         """
         Search for procedures matching the query.
@@ -264,244 +675,116 @@ class HospitalReimbursementBot:
             use_fuzzy: Whether to use fuzzy matching
             threshold: Minimum match score (0-100) for fuzzy matching
             top_n: Maximum number of results to return
+            columns: Data columns to return alongside MatchScore. Defaults to
+                Procedure, Code, Amount and SourceFile.
             
         Returns:
             Tuple containing:
                 - DataFrame with search results
                 - Total number of matches found
         """
-        print(f"\n[DEBUG] Starting search with query: '{query}'")
-        print(f"[DEBUG] Data available: {not (self.data is None or self.data.empty)}")
+        output_columns = list(columns or DEFAULT_RESULT_COLUMNS) + ['MatchScore']
+        
+        log.debug("Starting search with query: '%s'", query)
+        log.debug("Data available: %s", not (self.data is None or self.data.empty))
         
         if self.data is None or self.data.empty:
             print("[ERROR] No data available. Please load data first using load_data().")
-            return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
+            return pd.DataFrame(columns=output_columns), 0
             
         if not query or not query.strip():
             print("[ERROR] Please provide a search query.")
-            return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
+            return pd.DataFrame(columns=output_columns), 0
             
-        print(f"[SEARCH] Searching for: '{query}'" + (" (using fuzzy matching)" if use_fuzzy else ""))
-        print(f"[DEBUG] Data columns: {self.data.columns.tolist()}")
-        print(f"[DEBUG] First few rows:\n{self.data.head()}")
+        results, total = self._search_cached(
+            query, use_fuzzy, threshold, top_n, tuple(columns or DEFAULT_RESULT_COLUMNS)
+        )
+        # The cached frame is shared between calls, so hand out a copy
+        return results.copy(), total
+    
+    def _search(
+        self,
+        query: str,
+        use_fuzzy: bool,
+        threshold: int,
+        top_n: int,
+        columns: Tuple[str, ...]
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        Run a search against the loaded data; memoized per bot by _search_cached.
         
-        results = []
+        Args:
+            query: Non-empty search term
+            use_fuzzy: Whether to use fuzzy matching
+            threshold: Minimum match score (0-100) for fuzzy matching
+            top_n: Maximum number of results to return
+            columns: Data columns to return alongside MatchScore
+            
+        Returns:
+            Tuple[pd.DataFrame, int]: Search results and total number of matches found
+        """
+        output_columns = list(columns) + ['MatchScore']
+        
+        print(f"[SEARCH] Searching for: '{query}'" + (" (using fuzzy matching)" if use_fuzzy else ""))
+        log.debug("Data columns: %s", self.data.columns)
+        log.debug("First few rows:\n%s", self.data.head())
         
         try:
+            # Quick filters like 'amount < 5000' are answered with column masks
+            structured = parse_structured(query)
+            if structured is not None:
+                positions = self._structured_positions(structured)
+                log.debug("Found %d total matches", len(positions))
+                return self._results_frame(positions[:top_n], '100.0%', output_columns), len(positions)
+            
+            # A query that is exactly a known code is answered from the code index
+            code = query.strip().upper()
+            if self._code_index and CODE_QUERY.fullmatch(code) and code in self._code_index:
+                positions = self._code_index[code]
+                log.debug("Found %d total matches", len(positions))
+                return self._results_frame(positions[:top_n], '100.0%', output_columns), len(positions)
+            
             if use_fuzzy:
-                # Fuzzy search - check all text columns
-                text_columns = self.data.select_dtypes(include=['object']).columns
+                # Fuzzy search - score the text in one batch per column and keep the best
+                if self._choices is None:
+                    self._choices = self._build_choices()
                 
-                for _, row in self.data.iterrows():
-                    max_score = 0
-                    
-                    # Get the best match score across all text columns
-                    for col in text_columns:
-                        if col in row and pd.notna(row[col]):
-                            score = self._calculate_match_score(str(row[col]), query)
-                            max_score = max(max_score, score)
-                    
-                    if max_score >= threshold:
-                        result = {
-                            'Procedure': row.get('Procedure', 'N/A'),
-                            'Code': row.get('Code', 'N/A'),
-                            'Amount': row.get('Amount', 0),
-                            'SourceFile': row.get('SourceFile', 'Unknown'),
-                            'MatchScore': f"{max_score:.1f}%"
-                        }
-                        results.append(result)
-                        print(f"[DEBUG] Found match: {result}")
-            else:
-                # Exact search (case-insensitive)
-                query = str(query).lower()
-                for _, row in self.data.iterrows():
-                    match_found = False
-                    for col in self.data.select_dtypes(include=['object']).columns:
-                        if col in row and pd.notna(row[col]) and query in str(row[col]).lower():
-                            match_found = True
-                            break
-                    
-                    if match_found:
-                        result = {
-                            'Procedure': row.get('Procedure', 'N/A'),
-                            'Code': row.get('Code', 'N/A'),
-                            'Amount': row.get('Amount', 0),
-                            'SourceFile': row.get('SourceFile', 'Unknown'),
-                            'MatchScore': '100.0%'
-                        }
-                        results.append(result)
-                        print(f"[DEBUG] Found exact match: {result}")
-                        break  # Only add each row once
+                scores = np.zeros(len(self.data), dtype=np.float32)
+                # Choices are normalized already; rows that can't reach the threshold score 0
+                processed_query = utils.default_process(query)
+                for codes, uniques in self._choices.values():
+                    # Score each distinct string once and map the scores back to the rows
+                    unique_scores = process.cdist(
+                        [processed_query], uniques, scorer=fuzz.partial_ratio,
+                        score_cutoff=threshold, workers=-1
+                    )[0]
+                    np.maximum(scores, unique_scores[codes], out=scores)
                 
-            print(f"[DEBUG] Found {len(results)} total matches")
+                idx = np.where(scores >= threshold)[0]
+                top = idx[np.argsort(-scores[idx], kind='stable')[:top_n]]
+                log.debug("Found %d total matches", len(idx))
+                
+                return self._results_frame(top, scores[top], output_columns), len(idx)
             
-            # Convert results to DataFrame
-            if results:
-                results_df = pd.DataFrame(results)
-                # Ensure consistent column order
-                results_df = results_df[['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']]
-                return results_df.head(top_n), len(results_df)
+            # Exact search (case-insensitive) - one substring scan over the combined text
+            if self._text_array is not None:
+                positions = self._scan_text(query.lower())
+            else:
+                if 'SearchableText' in self.data.columns:
+                    searchable = self.data['SearchableText']
+                else:
+                    searchable = self._create_searchable_text(self.data, self._get_text_columns())
+                mask = searchable.str.contains(query, case=False, regex=False, na=False)
+                positions = np.flatnonzero(mask.to_numpy())
+            log.debug("Found %d total matches", len(positions))
             
-            return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
+            return self._results_frame(positions[:top_n], '100.0%', output_columns), len(positions)
             
         except Exception as e:
             print(f"[ERROR] Error during search: {str(e)}")
             import traceback
             print(traceback.format_exc())
-            return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
-
-def process_data(self) -> Optional[pd.DataFrame]:
-    """
-    Process the loaded data by standardizing and cleaning it.
-    
-    Returns:
-        Optional[pd.DataFrame]: Processed DataFrame or None if no data
-    """
-    if self.data is None or self.data.empty:
-        print("No data to process. Please load data first using load_data().")
-        return None
-        
-    print(f"Processing {len(self.data)} records...")
-    
-    # Ensure consistent data types
-    if 'Amount' in self.data.columns:
-        self.data['Amount'] = pd.to_numeric(self.data['Amount'], errors='coerce')
-        
-    # Fill any remaining NaN values in key columns
-    for col in ['Procedure', 'Code']:
-        if col in self.data.columns:
-            self.data[col] = self.data[col].fillna('Unknown')
-    
-    # Remove any completely empty rows
-    initial_count = len(self.data)
-    self.data = self.data.dropna(how='all')
-    if len(self.data) < initial_count:
-        print(f"  [INFO] Removed {initial_count - len(self.data)} completely empty rows")
-    
-    print(f"[DONE] Processing complete. {len(self.data)} records remaining after cleaning.")
-    return self.data
-        
-def _calculate_match_score(self, text: str, query: str) -> float:
-    """
-    Calculate a match score between text and query using fuzzy matching.
-    
-    Args:
-        text: Text to search in
-        query: Search query
-        
-    Returns:
-        float: Match score (0-100)
-    """
-    if not text or not query:
-        return 0.0
-        
-    # Convert to string and lowercase for case-insensitive comparison
-    text = str(text).lower()
-    query = query.lower()
-    
-    # Use partial ratio for partial matches
-    return fuzz.partial_ratio(text, query)
-
-def search(
-    self, 
-    query: str, 
-    use_fuzzy: bool = False, 
-    threshold: int = 70,
-    top_n: int = 5
-) -> Tuple[pd.DataFrame, int]:
-    """
-    Search for procedures matching the query.
-    
-    Args:
-        query: Search term
-        use_fuzzy: Whether to use fuzzy matching
-        threshold: Minimum match score (0-100) for fuzzy matching
-        top_n: Maximum number of results to return
-        
-    Returns:
-        Tuple containing:
-            - DataFrame with search results
-            - Total number of matches found
-    """
-    print(f"\n[DEBUG] Starting search with query: '{query}'")
-    print(f"[DEBUG] Data available: {not (self.data is None or self.data.empty)}")
-    
-    if self.data is None or self.data.empty:
-        print("[ERROR] No data available. Please load data first using load_data().")
-        return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
-        
-    if not query or not query.strip():
-        print("[ERROR] Please provide a search query.")
-        return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
-        
-    print(f"[SEARCH] Searching for: '{query}'" + (" (using fuzzy matching)" if use_fuzzy else ""))
-    print(f"[DEBUG] Data columns: {self.data.columns.tolist()}")
-    print(f"[DEBUG] First few rows:\n{self.data.head()}")
-    
-    results = []
-    
-    try:
-        if use_fuzzy:
-            # Fuzzy search - check all text columns
-            text_columns = self.data.select_dtypes(include=['object']).columns
-            
-            for _, row in self.data.iterrows():
-                max_score = 0
-                
-                # Get the best match score across all text columns
-                for col in text_columns:
-                    if col in row and pd.notna(row[col]):
-                        score = self._calculate_match_score(str(row[col]), query)
-                        max_score = max(max_score, score)
-                
-                if max_score >= threshold:
-                    result = {
-                        'Procedure': row.get('Procedure', 'N/A'),
-                        'Code': row.get('Code', 'N/A'),
-                        'Amount': row.get('Amount', 0),
-                        'SourceFile': row.get('SourceFile', 'Unknown'),
-                        'MatchScore': f"{max_score:.1f}%"
-                    }
-                    results.append(result)
-                    print(f"[DEBUG] Found match: {result}")
-        else:
-            # Exact search (case-insensitive)
-            query = str(query).lower()
-            for _, row in self.data.iterrows():
-                match_found = False
-                for col in self.data.select_dtypes(include=['object']).columns:
-                    if col in row and pd.notna(row[col]) and query in str(row[col]).lower():
-                        match_found = True
-                        break
-                
-                if match_found:
-                    result = {
-                        'Procedure': row.get('Procedure', 'N/A'),
-                        'Code': row.get('Code', 'N/A'),
-                        'Amount': row.get('Amount', 0),
-                        'SourceFile': row.get('SourceFile', 'Unknown'),
-                        'MatchScore': '100.0%'
-                    }
-                    results.append(result)
-                    print(f"[DEBUG] Found exact match: {result}")
-                    break  # Only add each row once
-        
-        print(f"[DEBUG] Found {len(results)} total matches")
-        
-        # Convert results to DataFrame
-        if results:
-            results_df = pd.DataFrame(results)
-            # Ensure consistent column order
-            results_df = results_df[['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']]
-            return results_df.head(top_n), len(results_df)
-        
-        return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
-        
-    except Exception as e:
-        print(f"[ERROR] Error during search: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        return pd.DataFrame(columns=['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']), 0
+            return pd.DataFrame(columns=output_columns), 0
 
 
 def interactive_search(bot):
@@ -547,11 +830,12 @@ def interactive_search(bot):
             print(f"{'PROCEDURE':<40} | {'CODE':<10} | {'AMOUNT':>10} | {'SOURCE':<20} | SCORE")
             print("-"*80)
             
-            for _, row in results.iterrows():
+            rows = results[['Procedure', 'Code', 'Amount', 'SourceFile', 'MatchScore']].itertuples(index=False, name=None)
+            for procedure, code, amount, source, score in rows:
                 # Truncate long procedure names for display
-                proc = (row['Procedure'][:37] + '...') if len(str(row['Procedure'])) > 40 else row['Procedure']
-                amount = f"${float(row.get('Amount', 0)):,.2f}" if pd.notna(row.get('Amount')) else "N/A"
-                print(f"{proc:<40} | {row.get('Code', ''):<10} | {amount:>10} | {row.get('SourceFile', '')[:17]:<20} | {row.get('MatchScore', '100.0%')}")
+                proc = (procedure[:37] + '...') if len(str(procedure)) > 40 else procedure
+                amount = f"${float(amount):,.2f}" if pd.notna(amount) else "N/A"
+                print(f"{proc:<40} | {code:<10} | {amount:>10} | {source[:17]:<20} | {score}")
             
             if total > 5:
                 print(f"\nShowing 5 of {total} total matches. Refine your search for better results.")
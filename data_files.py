@@ -0,0 +1,28 @@
+import pandas as pd
+from openpyxl import load_workbook
+
+# One data file with its SourceFile and the required columns; runs in a worker process,
+# so it lives in this importable module rather than in the Streamlit script
+def read_data_file(file):
+    # xlrd only reads legacy .xls files; the rest are streamed with openpyxl
+    df = pd.read_excel(file, engine='xlrd') if file.suffix == '.xls' else read_xlsx(file)
+    if not df.empty:
+        df['SourceFile'] = file.name
+        # Ensure required columns exist
+        for col in ['Procedure', 'Code', 'Amount']:
+            if col not in df.columns:
+                df[col] = ''
+    return df
+
+# First sheet of an .xlsx file, streamed row by row as plain values
+def read_xlsx(file):
+    workbook = load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        df = pd.DataFrame(rows, columns=[f'Unnamed: {i}' if name is None else name for i, name in enumerate(header)])
+    finally:
+        workbook.close()
+    # Drop the padding read_only mode yields: blank rows and unnamed empty columns
+    unnamed_empty = [col for col, name in zip(df.columns, header) if name is None and df[col].isna().all()]
+    return df.drop(columns=unnamed_empty).dropna(how='all').reset_index(drop=True).infer_objects()
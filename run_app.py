@@ -1,8 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from pathlib import Path
 from datetime import datetime
 import re
+import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+from data_files import read_data_file
 
 # Set page config
 st.set_page_config(
@@ -11,26 +16,41 @@ st.set_page_config(
     layout="wide"
 )
 
-# Simple CSS
+# Simple CSS, including the result card styles so the cards only carry class names
 st.markdown("""
-    <style>)
+    <style>
     .procedure-card {
-        background: white;
-        border-radius: 10px;
-        padding: 20px;
+        padding: 15px;
         margin: 10px 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        border-radius: 10px;
+        background-color: #f8f9fa;
+        border-left: 5px solid #1e88e5;
     }
     .amount {
         font-size: 1.2em;
-        font-weight: bold;
-        color: #1a73e8;
+        color: #2e7d32;
+    }
+    .note {
+        background-color: #fff8e1;
+        padding: 8px;
+        border-radius: 5px;
+    }
+    .source {
+        font-size: 0.85em;
+        color: #757575;
     }
     </style>
 """, unsafe_allow_html=True)
 
+# Name and modification time of each Excel file, so the cached data is reloaded when one changes
+def data_file_mtimes():
+    data_dir = Path("data")
+    excel_files = list(data_dir.glob("*.xlsx")) + list(data_dir.glob("*.xls"))
+    return tuple((file.name, file.stat().st_mtime) for file in excel_files)
+
 # Load data function
-def load_data():
+@st.cache_data(show_spinner=False)
+def load_data(mtimes):
     data_dir = Path("data")
     all_data = []
     
@@ -54,75 +74,251 @@ def load_data():
     
     # Try to load from Excel files first
     excel_loaded = False
-    excel_files = list(data_dir.glob("*.xlsx")) + list(data_dir.glob("*.xls"))
+    excel_files = [data_dir / name for name, _ in mtimes]
     
-    for file in excel_files:
-        try:
-            # Try with different engines if needed
-            try:
-                df = pd.read_excel(file, engine='openpyxl')
-            except:
-                df = pd.read_excel(file, engine='xlrd')
-                
-            if not df.empty:
-                df['SourceFile'] = file.name
-                # Ensure required columns exist
-                for col in ['Procedure', 'Code', 'Amount']:
-                    if col not in df.columns:
-                        df[col] = ''
-                all_data.append(df)
-                excel_loaded = True
-        except Exception as e:
-            st.warning(f"Error loading {file.name}: {str(e)}")
+    # Parquet copy of the prepared Excel data, valid while newer than every Excel file, the folder itself and this script
+    cache = data_dir / '.cache' / 'run_app.parquet'
+    if excel_files and cache.exists():
+        source_mtime = max([mtime for _, mtime in mtimes] + [data_dir.stat().st_mtime, Path(__file__).stat().st_mtime])
+        if cache.stat().st_mtime > source_mtime:
+            return pd.read_parquet(cache)
+    
+    # Parse the files in parallel worker processes
+    if excel_files:
+        with ProcessPoolExecutor(max_workers=min(len(excel_files), os.cpu_count() or 1)) as executor:
+            futures = {file: executor.submit(read_data_file, file) for file in excel_files}
+            for file, future in futures.items():
+                try:
+                    df = future.result()
+                except Exception as e:
+                    st.warning(f"Error loading {file.name}: {str(e)}")
+                    continue
+                if not df.empty:
+                    all_data.append(df)
+                    excel_loaded = True
     
     # If no Excel files loaded, use sample data
     if not excel_loaded:
         st.warning("Using sample data. Add Excel files to the 'data' folder to load your own data.")
-        return pd.DataFrame(sample_data)
+        return prepare(pd.DataFrame(sample_data))
     
-    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame(sample_data)
+    df = prepare(pd.concat(all_data, ignore_index=True))
+    try:
+        cache.parent.mkdir(exist_ok=True)
+        df.to_parquet(cache, compression='zstd')
+    except Exception as e:
+        st.warning(f"Could not cache the data: {str(e)}")
+    return df
+
+# Repetitive text columns, stored as categoricals so each distinct value is kept (and searched) once
+CATEGORY_COLUMNS = ['Procedure', 'Code', 'SectionReference', 'Exceptions', 'SourceFile']
+
+def to_categories(df):
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+# Weight of a query match in each field
+SEARCH_WEIGHTS = {
+    'Procedure': 3,         # procedure name (highest weight)
+    'Code': 2,              # code (high weight)
+    'SectionReference': 1,  # other text fields
+    'Documentation': 1,
+    'Exceptions': 1,
+}
+
+# Arrow-backed strings, so .str.lower/.str.contains run as Arrow compute kernels
+STRING_DTYPE = 'string[pyarrow]'
+
+# Lowercase copy of each searchable field, as _<field>_lc, so queries don't lowercase the data every time
+def add_lowercase(df):
+    for field in SEARCH_WEIGHTS:
+        if field in df.columns:
+            lower = df[field].astype(STRING_DTYPE).str.lower()
+            df[f'_{field}_lc'] = lower.astype('category') if field in CATEGORY_COLUMNS else lower
+    return df
+
+# Number of rows sharing each row's procedure, for the "common" quick search (0 for missing or blank names)
+def add_popularity(df):
+    if 'Procedure' in df.columns:
+        procedures = df['Procedure']
+        codes = procedures.cat.codes.to_numpy() + 1
+        named = np.append(False, procedures.cat.categories.astype(str).str.strip() != '')[codes]
+        df['_Popularity'] = np.where(named, np.bincount(codes)[codes], 0)
+    return df
+
+# Numeric amounts (float64, so cents stay exact at any size) and the smallest dtypes for integer columns
+def downcast(df):
+    if 'Amount' in df.columns:
+        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce').astype('float64')
+    for col in df.select_dtypes('int64').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+# HTML-escaped Documentation lines of each row, split once at load for the result cards (each distinct text split once)
+def add_doc_lists(df):
+    docs = df['Documentation'] if 'Documentation' in df.columns else pd.Series(np.nan, index=df.index)
+    codes, uniques = pd.factorize(docs)
+    lists = [[html.escape(line.strip()) for line in str(doc).split('\n') if line.strip()] for doc in uniques] + [[]]
+    df['DocList'] = pd.Series(lists, dtype=object).to_numpy()[codes]
+    return df
+
+# HTML-escaped copy of each text field shown on the result cards, as _<field>_html (categoricals escape each category once)
+HTML_COLUMNS = ['Procedure', 'Code', 'SectionReference', 'Exceptions', 'SourceFile']
+
+def add_html(df):
+    for col in HTML_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Escape each category once and broadcast through the codes; code -1 (missing) hits the NaN at the end
+            escaped = np.array([html.escape(str(value)) for value in values.cat.categories] + [np.nan], dtype=object)
+            df[f'_{col}_html'] = pd.Series(escaped[values.cat.codes.to_numpy()], index=df.index).astype('category')
+        else:
+            df[f'_{col}_html'] = values.map(lambda value: html.escape(str(value)), na_action='ignore')
+    return df
+
+def prepare(df):
+    return add_html(add_doc_lists(add_popularity(add_lowercase(to_categories(downcast(df))))))
+
+# Rows whose (lowercase) value contains the lowercase query, as a boolean array
+def contains(values, query):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Test each category once and broadcast through the codes; code -1 (missing) hits the False at the end
+        hit_categories = values.cat.categories.str.contains(query, regex=False)
+        return np.append(hit_categories, False)[values.cat.codes.to_numpy()]
+    return values.str.contains(query, regex=False).fillna(False).to_numpy(dtype=bool)
+
+# Inverted index over the searchable fields: each lowercase word -> positions of the rows containing it,
+# plus a trigram index over that vocabulary so partial words don't need a scan of every word
+def build_index(df):
+    tokens = []
+    for field in SEARCH_WEIGHTS:
+        if f'_{field}_lc' in df.columns:
+            text = pd.Series(df[f'_{field}_lc'].to_numpy(), index=np.arange(len(df))).dropna()
+            tokens.append(text.str.findall(r'\w+').explode().dropna())
+    if not tokens:
+        return pd.Series(dtype=object), {}
+    tokens = pd.concat(tokens)
+    words = pd.Series(tokens.index.to_numpy()).groupby(tokens.to_numpy()).unique()
+    grams = pd.Series([trigrams(word) for word in words.index], dtype=object).explode().dropna()
+    return words, pd.Series(grams.index.to_numpy()).groupby(grams.to_numpy()).unique().to_dict()
+
+def trigrams(text):
+    return list({text[i:i + 3] for i in range(len(text) - 2)})
+
+# Vocabulary words containing word: intersect the trigram postings, then verify the few words left
+def matching_words(index, word):
+    words, grams = index
+    if len(word) < 3:
+        return words[words.index.str.contains(word, regex=False)]
+    missing = np.array([], dtype=int)
+    ids = None
+    for gram in trigrams(word):
+        ids = grams.get(gram, missing) if ids is None else np.intersect1d(ids, grams.get(gram, missing))
+    ids = ids[words.index[ids].str.contains(word, regex=False)]
+    return words.iloc[ids]
 
-# Search function
-def search_data(df, query):
+# Rows that may contain the query: for every word of the query, a row must have a word containing it
+def candidate_rows(index, query):
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    rows = None
+    for word in words:
+        postings = matching_words(index, word)
+        word_rows = np.unique(np.concatenate(postings.to_list())) if len(postings) else np.array([], dtype=int)
+        rows = word_rows if rows is None else np.intersect1d(rows, word_rows)
+    return rows
+
+# Amount filters such as ">5000" or "<= 1200.50"
+AMOUNT_QUERY = re.compile(r'\s*([<>]=?)\s*(\d+(?:\.\d+)?)\s*$')
+
+# For each comparator: the searchsorted side of the cut, and whether the matches lie above it
+AMOUNT_CUTS = {'>': ('right', True), '>=': ('left', True), '<': ('left', False), '<=': ('right', False)}
+
+# Positions of the rows with an amount sorted by amount, those sorted amounts, and the positions highest first
+def amount_order(df):
+    amounts = pd.to_numeric(df['Amount'], errors='coerce').to_numpy(dtype=float) if 'Amount' in df.columns else np.array([])
+    valid = np.flatnonzero(~np.isnan(amounts))
+    order = valid[np.argsort(amounts[valid], kind='stable')]
+    # Highest first, with equal amounts still in row order
+    descending = valid[np.argsort(-amounts[valid], kind='stable')]
+    return order, amounts[order], descending
+
+# Search function, cached per data frame and query; the index arguments (underscored, so not hashed) derive from df
+@st.cache_data(max_entries=128, show_spinner=False, hash_funcs={pd.DataFrame: id})
+def search_data(df, query, _index=None, _amounts=None):
     if not df.empty and query and str(query).strip():
         query = str(query).lower().strip()
-        results = []
         
-        for _, row in df.iterrows():
-            # Check if query matches any field
-            match_score = 0
-            
-            # Check procedure name (highest weight)
-            if 'Procedure' in row and pd.notna(row['Procedure']):
-                if query in str(row['Procedure']).lower():
-                    match_score += 3
-            
-            # Check code (high weight)
-            if 'Code' in row and pd.notna(row['Code']):
-                if query in str(row['Code']).lower():
-                    match_score += 2
-            
-            # Check other text fields
-            text_fields = ['SectionReference', 'Documentation', 'Exceptions']
-            for field in text_fields:
-                if field in row and pd.notna(row[field]):
-                    if query in str(row[field]).lower():
-                        match_score += 1
-            
-            if match_score > 0:
-                result = row.copy()
-                result['MatchScore'] = match_score
-                results.append(result)
+        # Amount filter: binary search in the amount order, highest amounts first for ">" and lowest first for "<"
+        amount_query = AMOUNT_QUERY.match(query)
+        if amount_query and 'Amount' in df.columns:
+            op, value = amount_query.groups()
+            order, sorted_amounts, descending = _amounts if _amounts is not None else amount_order(df)
+            side, above = AMOUNT_CUTS[op]
+            cut = np.searchsorted(sorted_amounts, float(value), side=side)
+            return df.iloc[descending[:len(order) - cut][:10] if above else order[:cut][:10]]
+        
+        # Most common procedures, one row each
+        if query == 'common' and '_Popularity' in df.columns:
+            popularity = df['_Popularity'].to_numpy()
+            order = np.argsort(-popularity, kind='stable')
+            return df.iloc[order[popularity[order] > 0]].drop_duplicates('Procedure').head(10)
+        
+        # Narrow to the rows the index allows, then verify those with an exact substring test
+        rows = candidate_rows(_index, query) if _index is not None else None
+        if rows is not None:
+            df = df.iloc[rows]
+        
+        # Score every row at once: add the weight of each field containing the query in place (max score 8)
+        match_score = np.zeros(len(df), dtype=np.int16)
+        for field, weight in SEARCH_WEIGHTS.items():
+            if f'_{field}_lc' in df.columns:
+                np.add(match_score, weight, out=match_score, where=contains(df[f'_{field}_lc'], query))
         
         # Sort by match score and return top 10
-        results = sorted(results, key=lambda x: x['MatchScore'], reverse=True)
-        return pd.DataFrame(results[:10])
+        matched = np.flatnonzero(match_score > 0)
+        top = matched[np.argsort(-match_score[matched], kind='stable')[:10]]
+        results = df.iloc[top].copy()
+        results['MatchScore'] = match_score[top]
+        return results
     
     # If no query, return first 10 rows with required columns
-    required_cols = ['Procedure', 'Code', 'Amount', 'SectionReference', 'Documentation', 'Exceptions']
-    available_cols = [col for col in required_cols if col in df.columns]
+    required_cols = ['Procedure', 'Code', 'Amount', 'SectionReference', 'Documentation', 'DocList', 'Exceptions']
+    available_cols = [col for col in required_cols + [f'_{col}_html' for col in HTML_COLUMNS] if col in df.columns]
     return df[available_cols].head(10)
 
+# Result cards
+CARD_COLUMNS = ['Procedure', 'Code', 'SectionReference', 'Amount', 'DocList', 'Exceptions', 'SourceFile']
+
+CARD_TEMPLATE = """
+<div class='procedure-card'>
+    <h3>{procedure}</h3>
+    <p><strong>Code:</strong> {code} | <strong>Section:</strong> {section}</p>
+    <p class='amount'><strong>CHF {amount}</strong></p>
+    {details}
+</div>
+"""
+
+def card_details(row):
+    parts = []
+    if len(row.DocList):
+        docs = ''.join(f"<li>{doc}</li>" for doc in row.DocList)
+        parts.append(f"<p><strong>Documentation Required:</strong></p><ul>{docs}</ul>")
+    if pd.notna(row.Exceptions):
+        parts.append(f"<p class='note'><strong>Note:</strong> {row.Exceptions}</p>")
+    if pd.notna(row.SourceFile):
+        parts.append(f"<p class='source'>Source: {row.SourceFile}</p>")
+    return f"<details><summary>View Details</summary>{''.join(parts)}</details>"
+
+def format_amounts(amounts):
+    amounts = pd.to_numeric(amounts, errors='coerce')
+    return amounts.map('{:,.2f}'.format, na_action='ignore').fillna('N/A')
+
 # Main app
 def main():
     st.title("🏥 Hospital Reimbursement Portal")
@@ -135,7 +331,7 @@ def main():
     if st.session_state.data.empty:
         with st.spinner('Loading data...'):
             try:
-                st.session_state.data = load_data()
+                st.session_state.data = load_data(data_file_mtimes())
                 # Ensure required columns exist
                 required_cols = ['Procedure', 'Code', 'Amount']
                 for col in required_cols:
@@ -144,6 +340,8 @@ def main():
             except Exception as e:
                 st.error(f"Error loading data: {str(e)}")
                 st.session_state.data = pd.DataFrame()
+            st.session_state.index = build_index(st.session_state.data)
+            st.session_state.amounts = amount_order(st.session_state.data)
                 
     # Initialize search query in session state
     if 'search_query' not in st.session_state:
@@ -170,55 +368,37 @@ def main():
     
     # Display results
     if not st.session_state.data.empty:
-        results = search_data(st.session_state.data, search_query)
+        results = search_data(
+            st.session_state.data, search_query, st.session_state.get('index'), st.session_state.get('amounts')
+        )
         
         if results.empty:
             st.warning("No results found. Try a different search term.")
         else:
             st.write(f"Found {len(results)} results:")
             
-            for _, row in results.iterrows():
-                # Create a card for each result
-                with st.container():
-                    st.markdown(
-                        """
-                        <div style='
-                            padding: 15px;
-                            margin: 10px 0;
-                            border-radius: 10px;
-                            background-color: #f8f9fa;
-                            border-left: 5px solid #1e88e5;
-                        '>
-                            <h3>{procedure}</h3>
-                            <p><strong>Code:</strong> {code} | <strong>Section:</strong> {section}</p>
-                            <p style='font-size: 1.2em; color: #2e7d32;'><strong>CHF {amount}</strong></p>
-                        </div>
-                        """.format(
-                            procedure=row.get('Procedure', 'N/A'),
-                            code=row.get('Code', 'N/A'),
-                            section=row.get('SectionReference', 'N/A'),
-                            amount=f"{float(row.get('Amount', 0)):,.2f}" if pd.notna(row.get('Amount')) and str(row.get('Amount', '')).strip() not in ['', 'nan'] else 'N/A'
-                        ),
-                        unsafe_allow_html=True
+            # Cards show the escaped copies of the text fields under their plain names
+            cards = results.drop(columns=HTML_COLUMNS, errors='ignore')
+            cards = cards.rename(columns={f'_{col}_html': col for col in HTML_COLUMNS}).reindex(columns=CARD_COLUMNS)
+            for col in ['Procedure', 'Code', 'SectionReference']:
+                if f'_{col}_html' not in results.columns:
+                    cards[col] = 'N/A'
+            cards['AmountFmt'] = format_amounts(cards['Amount'])
+            
+            # One markdown call for all cards, with the details folded into <details> elements
+            st.markdown(
+                '<hr>'.join(
+                    CARD_TEMPLATE.format(
+                        procedure=row.Procedure,
+                        code=row.Code,
+                        section=row.SectionReference,
+                        amount=row.AmountFmt,
+                        details=card_details(row)
                     )
-                    
-                    # Show details in expander
-                    with st.expander("View Details", expanded=False):
-                        if 'Documentation' in row and pd.notna(row['Documentation']):
-                            st.markdown("**Documentation Required:**")
-                            docs = str(row['Documentation']).split('\n')
-                            for doc in docs:
-                                doc = doc.strip()
-                                if doc:
-                                    st.markdown(f"- {doc}")
-                        
-                        if 'Exceptions' in row and pd.notna(row['Exceptions']):
-                            st.warning(f"**Note:** {row['Exceptions']}")
-                        
-                        if 'SourceFile' in row and pd.notna(row['SourceFile']):
-                            st.caption(f"Source: {row['SourceFile']}")
-                            
-                    st.markdown("---")
+                    for row in cards.itertuples(index=False)
+                ),
+                unsafe_allow_html=True
+            )
     else:
         st.error("Failed to load data. Please check your data files.")
 
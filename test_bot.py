@@ -1,4 +1,7 @@
-from bot import HospitalReimbursementBot
+import pandas as pd
+from rapidfuzz import fuzz, utils
+
+from bot import HospitalReimbursementBot, parse_structured
 
 def test_search():
     print("Testing Hospital Reimbursement Bot...")
@@ -45,5 +48,120 @@ def test_search():
     print("\nSearch Results:")
     print("No results found" if results.empty else results.head())
 
+def test_fuzzy_ranking():
+    """Scoring SearchableText alone should still rank the intended procedure first."""
+    bot = HospitalReimbursementBot("data")
+    bot.data = pd.DataFrame({
+        'Procedure': ['Knee Arthroplasty', 'Cardiac Catheterization', 'Hip Replacement',
+                      'Appendectomy', 'Cataract Surgery'],
+        'Code': ['27447', '93458', '27130', '44970', '66984'],
+        'Amount': [12500.0, 3500.0, 11800.0, 6200.0, 2850.0],
+        'Department': ['Orthopedics', 'Cardiology', 'Orthopedics', 'General', 'Ophthalmology'],
+        'SourceFile': ['sample.xlsx'] * 5,
+    })
+    bot.data['SearchableText'] = bot._create_searchable_text(bot.data)
+    bot.process_data()
+    
+    for query, expected in [
+        ('hip replace', 'Hip Replacement'),
+        ('knee arthroplasty', 'Knee Arthroplasty'),
+        ('apendectomy', 'Appendectomy'),
+        ('cardiac cath', 'Cardiac Catheterization'),
+    ]:
+        results, total = bot.search(query, use_fuzzy=True, threshold=70)
+        assert total > 0
+        assert results['Procedure'].iloc[0] == expected
+
+def test_fuzzy_scores_every_row():
+    """Fuzzy search should count every row at or above the threshold, misspelled or not."""
+    bot = HospitalReimbursementBot("data")
+    bot.data = pd.DataFrame({
+        'Procedure': ['Appendectomy', 'Laparoscopic appendectomy', 'Hip Replacement',
+                      'Hip replacement revision', 'Knee Arthroscopy', 'Kneecap repair'],
+        'Code': ['44970', '44950', '27130', '27134', '29881', '27524'],
+        'SourceFile': ['sample.xlsx'] * 6,
+    })
+    bot.data['SearchableText'] = bot._create_searchable_text(bot.data)
+    bot.process_data()
+    
+    for query in ['apendectomy', 'hip replacment', 'knee']:
+        expected = sum(
+            fuzz.partial_ratio(utils.default_process(query), utils.default_process(text)) >= 70
+            for text in bot.data['SearchableText']
+        )
+        results, total = bot.search(query, use_fuzzy=True, threshold=70, top_n=10)
+        assert total == expected
+        assert len(results) == expected
+
+def _bot_with(frame):
+    """Bot over an in-memory frame, processed as after load_data."""
+    bot = HospitalReimbursementBot("data")
+    bot.data = frame
+    bot.data['SearchableText'] = bot._create_searchable_text(bot.data)
+    bot.process_data()
+    return bot
+
+def test_frequency_ignores_unknown_codes():
+    """Missing and 'Unknown' codes should not make placeholder rows the most common."""
+    bot = _bot_with(pd.DataFrame({
+        'Procedure': [f'Procedure {i}' for i in range(8)],
+        'Code': [None, 'Unknown', None, 'A1', 'B2', 'A1', None, 'Unknown'],
+        'SourceFile': ['sample.xlsx'] * 8,
+    }))
+    
+    results, total = bot.search('sort:frequency', top_n=3)
+    assert results['Procedure'].tolist() == ['Procedure 3', 'Procedure 5', 'Procedure 4']
+
+def test_structured_queries():
+    """Structured quick-filter queries should filter, sort, or fall back to text search."""
+    assert parse_structured('Amount < 5000') == ('amount', '<', 5000.0)
+    assert parse_structured('amount >= 12.5') == ('amount', '>=', 12.5)
+    assert parse_structured('valid_after 01/06/2024') == ('valid_after', pd.Timestamp(2024, 6, 1))
+    assert parse_structured('valid_after 31/02/2024') is None
+    assert parse_structured('sort:frequency') == ('sort', 'frequency')
+    assert parse_structured('Authorization required') == ('authorization',)
+    assert parse_structured('amount >5000 chf') is None
+    
+    bot = _bot_with(pd.DataFrame({
+        'Procedure': ['Knee Arthroplasty', 'Hip Replacement', 'Appendectomy', 'Cataract Surgery'],
+        'Code': ['27447', '27130', '44970', '27447'],
+        'Amount': [12500.0, 11800.0, 4200.0, 2850.0],
+        'ValidFrom': ['01/01/2023', '15/07/2024', '01/06/2024', '31/12/2022'],
+        'Exceptions': ['Prior authorization required', None, 'Amount >5000 CHF needs approval', None],
+        'SourceFile': ['sample.xlsx'] * 4,
+    }))
+    
+    def procedures(query):
+        results, total = bot.search(query, top_n=10)
+        assert total == len(results)
+        return results['Procedure'].tolist()
+    
+    assert procedures('amount < 5000') == ['Appendectomy', 'Cataract Surgery']
+    assert procedures('amount > 12000') == ['Knee Arthroplasty']
+    assert procedures('valid_after 01/06/2024') == ['Hip Replacement', 'Appendectomy']
+    assert procedures('sort:frequency')[:2] == ['Knee Arthroplasty', 'Cataract Surgery']
+    assert procedures('authorization required') == ['Knee Arthroplasty']
+    # Not a valid amount filter, so it is searched as text
+    assert procedures('amount >5000 chf') == ['Appendectomy']
+
+def test_code_queries():
+    """Exact code queries should use the code index and otherwise fall through to the text scan."""
+    bot = _bot_with(pd.DataFrame({
+        'Procedure': ['Appendectomy', 'Knee Arthroplasty', 'Implant HIP01 kit'],
+        'Code': [44970.0, 27447.0, None],
+        'SourceFile': ['sample.xlsx'] * 3,
+    }))
+    assert '44970' in bot._code_index
+    assert 'UNKNOWN' not in bot._code_index
+    
+    results, total = bot.search('44970')
+    assert total == 1
+    assert results['Procedure'].tolist() == ['Appendectomy']
+    
+    # Code-shaped, but not a known code
+    results, total = bot.search('HIP01')
+    assert total == 1
+    assert results['Procedure'].tolist() == ['Implant HIP01 kit']
+
 if __name__ == "__main__":
     test_search()
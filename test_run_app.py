@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+import run_app
+
+# The uncached search, so each call really searches (the cache key ignores the index arguments)
+search_data = run_app.search_data.__wrapped__
+
+def _procedures():
+    return run_app.prepare(pd.DataFrame({
+        'Procedure': ['Knee Replacement', 'Hip Replacement', 'Kneecap repair', 'Appendectomy', 'Colonoscopy'],
+        'Code': ['KR-101', 'HR-202', 'KC-303', 'AP-404', 'CL-505'],
+        'Amount': [12500.0, 11800.0, 4200.0, 8500.0, 3200.0],
+        'SectionReference': ['4.2.1', '4.2.2', '4.3.1', '3.1.5', '3.3.2'],
+        'Documentation': ['Pre-op report\nSurgical notes', 'X-ray results', None, 'Lab results', 'Referral letter'],
+        'Exceptions': ['Requires pre-authorization', None, 'Standard procedure', 'Standard procedure', None],
+    }))
+
+def test_index_keeps_results():
+    """Narrowing with the word and trigram index should not change any result."""
+    df = _procedures()
+    index = run_app.build_index(df)
+
+    for query in ['knee', 'ip re', 'ip', 'a', 'replacement', 'ectomy', 'kr-1', '4.2', 'pre-op', '-', 'xyzq']:
+        full = search_data(df, query)
+        indexed = search_data(df, query, index)
+        assert indexed.index.tolist() == full.index.tolist(), query
+        assert indexed['MatchScore'].tolist() == full['MatchScore'].tolist(), query
+
+    assert search_data(df, 'ip re', index)['Procedure'].tolist() == ['Hip Replacement']
+
+def test_amount_filters():
+    """Amount filters should respect their boundary, skip rows without an amount, and list ">" highest first
+    and "<" lowest first (equal amounts in row order)."""
+    df = run_app.prepare(pd.DataFrame({
+        'Procedure': list('abcdefg'),
+        'Amount': [5, 1, None, 7, 5, 'n/a', 3],
+    }))
+    amounts = run_app.amount_order(df)
+
+    for query, expected in [
+        ('>5', ['d']),
+        ('>=5', ['d', 'a', 'e']),
+        ('<5', ['b', 'g']),
+        ('<=5', ['b', 'g', 'a', 'e']),
+        ('> 2.5', ['d', 'a', 'e', 'g']),
+        ('>100', []),
+        ('<0', []),
+    ]:
+        assert search_data(df, query, None, amounts)['Procedure'].tolist() == expected, query
+        # Without a precomputed order, search_data sorts on the fly
+        assert search_data(df, query)['Procedure'].tolist() == expected, query
+    assert np.isnan(search_data(df, '>=0', None, amounts)['Amount']).sum() == 0
+
+def test_common_procedures():
+    """"common" should list the most frequent named procedures once each, most frequent first."""
+    df = run_app.prepare(pd.DataFrame({
+        'Procedure': ['Hip', 'Knee', '', 'Knee', None, 'Hip', 'Knee', '', '', ''],
+        'Amount': range(10),
+    }))
+    assert df['_Popularity'].tolist() == [2, 3, 0, 3, 0, 2, 3, 0, 0, 0]
+
+    results = search_data(df, 'common')
+    assert results['Procedure'].tolist() == ['Knee', 'Hip']
+    assert results['Amount'].tolist() == [1, 0]